@@ -4,17 +4,46 @@ import css_parser as css_utils
 from pathlib import Path
 import hashlib
 import logging
+import asyncio
+import os
 import base64
 import string
 import httpx
 import json
-import cgi
 
-from typing import Tuple, Dict, Optional
+from importlib.util import find_spec
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Coroutine, Tuple, Dict, List, Optional, TypeVar
 
+# `pybase64` is optional, it's a SIMD accelerated drop-in for `base64`
+try:
+    from pybase64 import b64encode_as_string
+except ImportError:
+    def b64encode_as_string(s: bytes) -> str:
+        return base64.b64encode(s).decode('ascii')
+
+
+T = TypeVar('T')
+
+http2_available = find_spec('h2') is not None
+
+def run_coroutine(coroutine: Coroutine[Any, Any, T]) -> T:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    # `asyncio.run` can't be nested inside of a running event
+    # loop (e.g. Jupyter), so the coroutine gets its own thread
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
 
 html_node_template = '<html><body><{0}>{1}</{0}></body></html>'
 
+# Tags whose contents are raw text rather than markup
+raw_text_tags = frozenset({'style', 'script'})
+
 def update_node(
     node: Node,
     *,
@@ -28,65 +57,160 @@ def update_node(
     if contents is None:
         contents = node.text()
 
+    # Other tags get their contents parsed as HTML
+    if tag not in raw_text_tags:
+        if attrs is None:
+            attrs = node.attrs
+
+        replacement_node = html_node_template.format(tag, contents)
+        replacement_node = HTMLParser(replacement_node).body.child
+
+        for attr, value in attrs.items():
+            replacement_node.attrs[attr] = value
+
+        node.replace_with(replacement_node)
+
+        return
+
+    # Raw text contents never need parsing, keeping the
+    # same tag means the node can just be updated in place
+    if tag == node.tag:
+        for child in list(node.iter(include_text=True)):
+            child.decompose()
+
+        if attrs is not None:
+            for attr in list(node.attrs.keys()):
+                if attr not in attrs:
+                    del node.attrs[attr]
+
+            for attr, value in attrs.items():
+                node.attrs[attr] = value
+
+        node.insert_child(contents)
+
+        return
+
     if attrs is None:
         attrs = node.attrs
 
-    replacement_node = html_node_template.format(tag, contents)
+    # Only an empty tag gets parsed, the contents are
+    # inserted as text so they never go through the parser
+    replacement_node = html_node_template.format(tag, '')
     replacement_node = HTMLParser(replacement_node).body.child
 
     for attr, value in attrs.items():
         replacement_node.attrs[attr] = value
 
+    replacement_node.insert_child(contents)
+
     node.replace_with(replacement_node)
 
+@lru_cache(maxsize=4096)
 def generate_url_hash(url: str) -> str:
     url_hash = hashlib \
-        .sha1(url.encode()) \
+        .blake2b(url.encode(), digest_size=10) \
         .hexdigest()
 
     return f'_{url_hash}'
 
+# Leading and trailing C0 control characters and spaces, plus
+# tabs and newlines anywhere, are ignored in urls by browsers
+url_strip_chars = ''.join(map(chr, range(0x21)))
+url_remove_chars = str.maketrans('', '', '\t\r\n')
+
+@lru_cache(maxsize=4096)
 def normalize_url(root_url: str, url: str) -> str:
-    *url_pieces, _, _ = url_parse.urlsplit(
-        url_parse.urljoin(root_url, url)
-    )
+    if url:
+        url = url.strip(url_strip_chars).translate(url_remove_chars)
+
+    # Absolute urls come back from `urljoin` unchanged anyway
+    if not (url and url.startswith(('http://', 'https://', 'data:'))):
+        url = url_parse.urljoin(root_url, url)
+
+    # Dropping the query and fragment only takes a slice,
+    # so there is no need to split and rebuild the whole url
+    url_end = len(url)
+
+    for separator in ('?', '#'):
+        separator_index = url.find(separator, 0, url_end)
+
+        if separator_index != -1:
+            url_end = separator_index
+
+    return url_parse.unquote(url[:url_end])
+
+def get_url_suffix(url: str) -> str:
+    # The lowercased extension of the last path segment, like
+    # `Path(url_path).suffix.lower()`, except that a trailing
+    # `/.` segment is not dropped the way `Path` drops it
+    url_path = url_parse.urlsplit(url).path
+    file_name = url_path.rstrip('/').rpartition('/')[2]
+
+    dot_index = file_name.rfind('.')
+
+    if 0 < dot_index < len(file_name) - 1:
+        return file_name[dot_index:].lower()
+
+    return ''
 
-    url = url_parse.urlunsplit((*url_pieces, '', ''))
+# A multiple of 3 bytes, so no chunk gets padded mid-stream
+base64_chunk_size = 57 * 1024
 
-    return url_parse.unquote(url)
+def encode_file_base64(file: Path) -> str:
+    encoded_chunks = []
+
+    with open(file, 'rb') as f:
+        while chunk := f.read(base64_chunk_size):
+            encoded_chunks.append(b64encode_as_string(chunk))
+
+    return ''.join(encoded_chunks)
 
 class HTMLTemplate(string.Template):
     delimiter = '$$$'
 
-asset_url_file_formats = {
+asset_url_file_formats = frozenset({
     '.bmp', '.css', '.doc', '.docx', '.eot', '.gif',
     '.ico', '.jpeg', '.jpg', '.mp3', '.mp4', '.odt',
     '.ogg', '.otf', '.pdf', '.png', '.rtf', '.svg',
     '.tif', '.tiff', '.ttf', '.txt', '.wav', '.webm',
     '.webp', '.woff', '.woff2', '.xls', '.xlsb',
     '.xlsx', '.xml'
-}
+})
 
 lookup_tag_attrs = {
     'image': 'xlink:href',
     'use': 'xlink:href',
+    'source': 'src',
+    'track': 'src',
+    'audio': 'src',
+    'video': 'src',
+    'embed': 'src',
+    'iframe': 'src',
+    'img': 'src',
     'object': 'data',
     'link': 'href'
 }
 
-lookup_css_query = ', '.join([
-    'svg image[xlink\:href]',
-    'svg use[xlink\:href]',
-    'source[src]',
-    'track[src]',
-    'audio[src]',
-    'video[src]',
-    'embed[src]',
-    'iframe[src]',
-    'img[src]',
-    'object[data]',
-    'link[rel*="stylesheet"][href]'
-])
+def get_asset_attr(node: Node, attrs: Dict[str, str]) -> Optional[str]:
+    tag_attr = lookup_tag_attrs.get(node.tag)
+
+    if tag_attr is None or tag_attr not in attrs:
+        return None
+
+    if node.tag == 'link':
+        if 'stylesheet' not in (attrs.get('rel') or '').lower():
+            return None
+    elif node.tag in ('image', 'use'):
+        # `image` and `use` only reference assets inside of an `<svg />`
+        parent = node.parent
+
+        while parent is not None and parent.tag != 'svg':
+            parent = parent.parent
+
+        if parent is None:
+            return None
+
+    return tag_attr
 
 class Archiver:
     def __init__(
@@ -94,6 +218,7 @@ class Archiver:
         save_folder: Path | str,
         *,
         http_timeout: int=100,
+        pretty_metadata: bool=False,
         user_agent: str='Mozilla/5.0 (X11; Linux i686; rv:111.0) Gecko/20100101 Firefox/111.0'
     ):
         if isinstance(save_folder, str):
@@ -110,6 +235,7 @@ class Archiver:
             self.assets_folder.mkdir()
 
         self.metadata_file = self.container_folder.joinpath('metadata.json')
+        self.pretty_metadata = pretty_metadata
 
         self.httpx_options = {
             'follow_redirects': True,
@@ -119,6 +245,15 @@ class Archiver:
             }
         }
 
+        self.httpx_client = httpx.Client(
+            http2=http2_available,
+            limits=httpx.Limits(
+                max_keepalive_connections=32,
+                max_connections=64
+            ),
+            **self.httpx_options
+        )
+
         self.initialize()
 
     def initialize(self):
@@ -137,14 +272,32 @@ class Archiver:
 
         css_serializer = css_utils.CSSSerializer(css_serializer_options)
 
-        self.httpx_client = None
+        # Resolved asset urls, keyed by normalized
+        # url and reset for every archived page
+        self._resolver_cache: Dict[str, str] = {}
+
+        # Flattened stylesheets, keyed by their source text,
+        # encoding and url and also reset for every page
+        self._stylesheet_cache: Dict[Tuple[str, str, str], bytes] = {}
+
+        # Every asset already downloaded into this folder, so
+        # known asset urls resolve without touching the disk
+        if self.metadata_file.exists():
+            with open(self.metadata_file, 'r') as f:
+                self.asset_urls_metadata = json.load(f)
+        else:
+            self.asset_urls_metadata = {}
+
+        self._asset_index: Dict[str, str] = {
+            id_metadata['url']: template_id
+            for template_id, id_metadata in self.asset_urls_metadata.items()
+        }
 
     def __enter__(self):
-        self.httpx_client = httpx.Client(**self.httpx_options)
         return self
 
     def __exit__(self, *_):
-        self.httpx_client = None
+        self.httpx_client.close()
 
     def get_url_raw_html_file(self, url: str) -> Path:
         identifier = generate_url_hash(url)
@@ -158,16 +311,6 @@ class Archiver:
         return self.container_folder \
             .joinpath(f'{identifier}.template.html')
 
-    def url_to_file(self, url: str) -> Path:
-        url_hash = generate_url_hash(url)
-
-        url_path = url_parse.urlsplit(url).path
-        url_suffix = Path(url_path).suffix.lower()
-
-        return self.assets_folder \
-            .joinpath(url_hash) \
-            .with_suffix(url_suffix)
-
     def template_id_to_file(self, template_id: str) -> Path:
         *file_stem_chunks, suffix = template_id.split('_')
         file_stem = '_'.join(file_stem_chunks)
@@ -177,72 +320,215 @@ class Archiver:
             .joinpath(file_stem) \
             .with_suffix(f'.{suffix}')
 
-    def _url_resolver(self, asset_url: str, asset_urls_metadata: Dict[str, Dict[str, str]]) -> str:
-        asset_url = normalize_url(url, asset_url)
-        asset_file = self.url_to_file(asset_url)
+    def _url_resolver(
+        self,
+        base_url: str,
+        asset_url: str,
+        pending_asset_urls: Dict[str, str]
+    ) -> str:
+        asset_url = normalize_url(base_url, asset_url)
+
+        template_identifier = self._asset_index.get(asset_url)
 
-        if asset_file.suffix not in asset_url_file_formats:
+        if template_identifier is not None:
+            return f'$$${{{template_identifier}}}'
+
+        if asset_url in self._resolver_cache:
+            return self._resolver_cache[asset_url]
+
+        url_suffix = get_url_suffix(asset_url)
+
+        if url_suffix not in asset_url_file_formats:
             if asset_url.startswith('data:'):
-                return asset_url
+                resolved_url = asset_url
             else:
                 fragment = url_parse.urlsplit(asset_url).fragment
 
                 if fragment == '':
-                    return asset_url
+                    resolved_url = asset_url
                 else:
-                    return f'#{fragment}'
+                    resolved_url = f'#{fragment}'
+        else:
+            url_hash = generate_url_hash(asset_url)
+            template_identifier = f'{url_hash}_{url_suffix[1:]}'
 
-        template_identifier = f'{asset_file.stem}_{asset_file.suffix[1:]}'
+            # Assets are only queued here, they get checked
+            # and downloaded together by `_download_assets`
+            pending_asset_urls[template_identifier] = asset_url
 
-        if not asset_file.exists():
-            encoding, content_type, text, content = self._url_fetcher(
-                asset_url,
-                return_bytes=True
-            )
+            resolved_url = f'$$${{{template_identifier}}}'
 
-            asset_urls_metadata[template_identifier] = {
-                'content_type': content_type,
-                'url': asset_url
-            }
+        self._resolver_cache[asset_url] = resolved_url
 
-            if asset_file.suffix == '.css':
-                stylesheet = self.css_parser.parseString(
-                    text,
-                    encoding=encoding,
-                    href=url
-                )
+        return resolved_url
 
-                flat_stylesheet = css_utils.css.CSSStyleSheet()
-                css_utils.resolveImports(stylesheet, flat_stylesheet)
+    async def _fetch_all(
+        self,
+        httpx_client: httpx.AsyncClient,
+        urls: List[str]
+    ) -> List[httpx.Response]:
+        return await asyncio.gather(
+            *[httpx_client.get(url) for url in urls]
+        )
 
-                css_utils.replaceUrls(
-                    flat_stylesheet,
-                    lambda u: self._url_resolver(u, asset_urls_metadata),
-                    ignoreImportRules=True
-                )
+    def _download_assets(
+        self,
+        pending_asset_urls: Dict[str, str],
+        asset_urls_metadata: Dict[str, Dict[str, str]]
+    ) -> None:
+        run_coroutine(
+            self._download_assets_async(pending_asset_urls, asset_urls_metadata)
+        )
+
+    async def _download_assets_async(
+        self,
+        pending_asset_urls: Dict[str, str],
+        asset_urls_metadata: Dict[str, Dict[str, str]]
+    ) -> None:
+        claimed_asset_files = {}
+        written_stylesheets = {}
+
+        try:
+            # One client for every round, so connections
+            # opened in the first round get reused after
+            async with httpx.AsyncClient(
+                http2=http2_available,
+                limits=httpx.Limits(max_connections=32),
+                **self.httpx_options
+            ) as httpx_client:
+                # Stylesheets can reference more assets, so those
+                # are queued up and fetched in the next round
+                while pending_asset_urls:
+                    next_asset_urls = {}
+
+                    # Exclusively creating the asset file doubles as the
+                    # check for whether it has already been downloaded
+                    for template_identifier in pending_asset_urls:
+                        asset_file = self.template_id_to_file(template_identifier)
+
+                        try:
+                            claimed_asset_files[template_identifier] = os.open(
+                                asset_file,
+                                os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                                0o644
+                            )
+                        except FileExistsError:
+                            # A file that never made it into the metadata
+                            # (e.g. a failed run) can't be rendered, so it
+                            # gets downloaded again
+                            if template_identifier not in asset_urls_metadata:
+                                claimed_asset_files[template_identifier] = os.open(
+                                    asset_file,
+                                    os.O_WRONLY | os.O_TRUNC
+                                )
+
+                    template_identifiers = list(claimed_asset_files)
+
+                    responses = await self._fetch_all(httpx_client, [
+                        pending_asset_urls[template_identifier]
+                        for template_identifier in template_identifiers
+                    ])
+
+                    for template_identifier, response in zip(
+                        template_identifiers,
+                        responses
+                    ):
+                        asset_url = pending_asset_urls[template_identifier]
+
+                        encoding, content_type, text, content = self._read_response(
+                            response,
+                            return_bytes=True
+                        )
+
+                        if template_identifier.endswith('_css'):
+                            content = self._flatten_and_rewrite_css(
+                                text,
+                                encoding=encoding,
+                                href=asset_url,
+                                pending_asset_urls=next_asset_urls
+                            )
+
+                        asset_fd = claimed_asset_files[template_identifier]
+
+                        with open(asset_fd, 'wb', closefd=False) as f:
+                            f.write(content)
+
+                        os.close(claimed_asset_files.pop(template_identifier))
+
+                        id_metadata = {
+                            'content_type': content_type,
+                            'url': asset_url
+                        }
+
+                        if template_identifier.endswith('_css'):
+                            written_stylesheets[template_identifier] = id_metadata
+                        else:
+                            asset_urls_metadata[template_identifier] = id_metadata
+                            self._asset_index[asset_url] = template_identifier
+
+                    pending_asset_urls = next_asset_urls
+
+            # Stylesheets are only complete once every asset they use is,
+            # so they're recorded last and after a failure get downloaded
+            # again, which queues up whatever they use that is missing
+            for template_identifier, id_metadata in written_stylesheets.items():
+                asset_urls_metadata[template_identifier] = id_metadata
+                self._asset_index[id_metadata['url']] = template_identifier
+        except BaseException:
+            # Claimed files that never got written would
+            # otherwise be mistaken for downloaded assets
+            for template_identifier, asset_fd in claimed_asset_files.items():
+                os.close(asset_fd)
+                self.template_id_to_file(template_identifier).unlink(missing_ok=True)
+
+            raise
+
+    def _flatten_and_rewrite_css(
+        self,
+        text: str,
+        *,
+        encoding: str,
+        href: str,
+        pending_asset_urls: Dict[str, str]
+    ) -> bytes:
+        cache_key = (text, encoding, href)
+
+        if cache_key in self._stylesheet_cache:
+            return self._stylesheet_cache[cache_key]
+
+        stylesheet = self.css_parser.parseString(
+            text,
+            encoding=encoding,
+            href=href
+        )
 
-                css = flat_stylesheet \
-                    .cssText \
-                    .decode(flat_stylesheet.encoding)
+        flat_stylesheet = css_utils.css.CSSStyleSheet()
+        css_utils.resolveImports(stylesheet, flat_stylesheet)
 
-                asset_file.write_text(css, encoding=encoding)
-            else:
-                if content_type.startswith('text'):
-                    asset_file.write_text(text, encoding=encoding)
-                else:
-                    asset_file.write_bytes(content)
+        css_utils.replaceUrls(
+            flat_stylesheet,
+            lambda u: self._url_resolver(href, u, pending_asset_urls),
+            ignoreImportRules=True
+        )
 
-        return f'$$${{{template_identifier}}}'
+        # The flattened stylesheet is always serialized as UTF-8
+        css = flat_stylesheet.cssText
+
+        self._stylesheet_cache[cache_key] = css
+
+        return css
 
     def _url_fetcher(self, url: str, return_bytes=False) -> Tuple[str, str]:
-        if self.httpx_client is None:
-            response = httpx.get(url, **self.httpx_options)
-        else:
-            response = self.httpx_client.get(url)
+        response = self.httpx_client.get(url)
+
+        return self._read_response(response, return_bytes=return_bytes)
 
+    def _read_response(self, response: httpx.Response, return_bytes=False) -> Tuple[str, str]:
         if return_bytes:
-            content_type = response.headers.get('content-type', '')
-            content_type, _ = cgi.parse_header(content_type)
+            content_type = response.headers.get('content-type', '') \
+                .split(';', 1)[0] \
+                .strip() \
+                .lower()
 
             return (
                 response.encoding,
@@ -255,8 +541,8 @@ class Archiver:
 
     @classmethod
     def archive_simple(cls, url: str, save_folder: Path | str) -> None:
-        archiver = cls(save_folder)
-        archiver.archive_url(url)
+        with cls(save_folder) as archiver:
+            archiver.archive_url(url)
 
     def archive_url(self, url: str) -> None:
         encoding, html = self._url_fetcher(url)
@@ -270,10 +556,36 @@ class Archiver:
 
         html = HTMLParser(html)
 
-        asset_urls_metadata = {}
+        self._resolver_cache = {}
+        self._stylesheet_cache = {}
+
+        pending_asset_urls = {}
+
+        inline_style_tags = []
+        asset_tags = []
+        style_tags = []
+        script_tags = []
+
+        # Collect every tag that needs rewriting
+        # in a single walk over the document
+        for tag in html.root.traverse(include_text=False):
+            tag_attrs = tag.attrs
+
+            if 'style' in tag_attrs:
+                inline_style_tags.append(tag)
+
+            if tag.tag == 'style':
+                style_tags.append(tag)
+            elif tag.tag == 'script':
+                script_tags.append(tag)
+            else:
+                tag_attr = get_asset_attr(tag, tag_attrs)
+
+                if tag_attr is not None:
+                    asset_tags.append((tag, tag_attr))
 
         # Look for any tag with inline styles
-        for tag in html.css('*[style]'):
+        for tag in inline_style_tags:
             tag_attr_css = tag.attrs.get('style')
 
             stylesheet = self.css_parser.parseStyle(
@@ -283,7 +595,7 @@ class Archiver:
 
             css_utils.replaceUrls(
                 stylesheet,
-                lambda u: self._url_resolver(u, asset_urls_metadata),
+                lambda u: self._url_resolver(url, u, pending_asset_urls),
                 ignoreImportRules=True
             )
 
@@ -291,11 +603,10 @@ class Archiver:
 
         # Look for tags that have asset attrs, such
         # as `<img />`, `<iframe />`, and `<video />`
-        for tag in html.css(lookup_css_query):
-            tag_attr = lookup_tag_attrs.get(tag.tag, 'src')
+        for tag, tag_attr in asset_tags:
             tag_url = tag.attrs.get(tag_attr)
 
-            template_id = self._url_resolver(tag_url, asset_urls_metadata)
+            template_id = self._url_resolver(url, tag_url, pending_asset_urls)
 
             if tag.tag == 'link':
                 tag.attrs['data-template-id'] = template_id[4:-1]
@@ -303,51 +614,33 @@ class Archiver:
                 tag.attrs[tag_attr] = template_id
 
         # Look for style tags
-        for style_tag in html.css('style'):
+        for style_tag in style_tags:
             style_tag_css = style_tag.text(strip=True)
 
-            stylesheet = self.css_parser.parseString(
+            style_tag_css = self._flatten_and_rewrite_css(
                 style_tag_css,
                 encoding=encoding,
-                href=url
-            )
-
-            flat_stylesheet = css_utils.css.CSSStyleSheet()
-            css_utils.resolveImports(stylesheet, flat_stylesheet)
-
-            css_utils.replaceUrls(
-                flat_stylesheet,
-                lambda u: self._url_resolver(u, asset_urls_metadata),
-                ignoreImportRules=True
-            )
-
-            style_tag_css = flat_stylesheet \
-                .cssText \
-                .decode(flat_stylesheet.encoding)
-
-            new_style_tag = HTMLParser(
-                '<html><body><{0}>{1}</{0}></body></html>'.format(
-                    style_tag.tag,
-                    style_tag_css
-                )
-            ).body.child
-
-            for attr, val in style_tag.attrs.items():
-                new_style_tag.attrs[attr] = val
-
-            style_tag.replace_with(new_style_tag)
+                href=url,
+                pending_asset_urls=pending_asset_urls
+            ).decode('utf-8')
+
+            # Swap out the text of the style tag in place
+            # instead of parsing a whole replacement tag
+            if style_tag.child is None:
+                style_tag.insert_child(style_tag_css)
+            else:
+                style_tag.child.replace_with(style_tag_css)
 
-        with open(self.metadata_file, 'w') as f:
-            json.dump(
-                asset_urls_metadata,
-                f,
-                sort_keys=True,
-                indent=4
-            )
+        # Saved even when a download fails, so every asset
+        # that did get written is recorded for later runs
+        try:
+            self._download_assets(pending_asset_urls, self.asset_urls_metadata)
+        finally:
+            self.save_metadata()
 
         # Eliminate all script tags because they
         # will just throw a bunch of errors
-        for script_tag in html.css('script'):
+        for script_tag in script_tags:
             script_tag.decompose()
 
         template_file = self.get_url_template_html_file(url)
@@ -359,31 +652,49 @@ class Archiver:
 
     def get_template_identifiers(self, template: string.Template, metadata: Dict[str, Dict[str, str]]) -> Dict[str, str]:
         template_vars = {}
+        css_templates = {}
 
-        for template_id in template.get_identifiers():
-            id_metadata = metadata[template_id]
-            content_type = id_metadata['content_type']
+        template_ids = list(template.get_identifiers())
 
-            if content_type == 'text/css':
-                content = self \
-                    .template_id_to_file(template_id) \
-                    .read_text(encoding='utf-8')
+        # Stylesheets are only rendered once all of the identifiers
+        # they use have been, so each one is revisited after those
+        while template_ids:
+            template_id = template_ids.pop()
 
-                css_template = HTMLTemplate(content)
+            if template_id in template_vars:
+                continue
 
-                css_str = css_template.substitute(
-                    self.get_template_identifiers(css_template, metadata)
-                )
+            id_metadata = metadata[template_id]
+            content_type = id_metadata['content_type']
 
+            if content_type == 'text/css':
+                if template_id not in css_templates:
+                    content = self \
+                        .template_id_to_file(template_id) \
+                        .read_text(encoding='utf-8')
+
+                    css_template = HTMLTemplate(content)
+                    css_templates[template_id] = css_template
+
+                    missing_template_ids = [
+                        css_template_id
+                        for css_template_id in css_template.get_identifiers()
+                        if css_template_id not in template_vars
+                    ]
+
+                    if missing_template_ids:
+                        template_ids.append(template_id)
+                        template_ids.extend(missing_template_ids)
+                        continue
+
+                css_str = css_templates[template_id].substitute(template_vars)
                 css_str = url_parse.quote(css_str)
 
                 data_url = f'data:text/css;charset=UTF-8,{css_str}'
             else:
-                content = self \
-                    .template_id_to_file(template_id) \
-                    .read_bytes()
-
-                encoded_content = base64.b64encode(content).decode()
+                encoded_content = encode_file_base64(
+                    self.template_id_to_file(template_id)
+                )
 
                 data_url = f'data:{content_type};base64,{encoded_content}'
 
@@ -391,6 +702,22 @@ class Archiver:
 
         return template_vars
 
+    def save_metadata(self) -> None:
+        with open(self.metadata_file, 'w') as f:
+            if self.pretty_metadata:
+                json.dump(
+                    self.asset_urls_metadata,
+                    f,
+                    sort_keys=True,
+                    indent=4
+                )
+            else:
+                json.dump(
+                    self.asset_urls_metadata,
+                    f,
+                    separators=(',', ':')
+                )
+
     def render_url_to_flat_file(self, url: str, save_file: Path | str) -> None:
         with open(self.metadata_file, 'r') as f:
             metadata = json.load(f)
@@ -1,32 +1,39 @@
+import re
+
+
+# Leading digits (optionally after a `-`) and every character
+# outside of `[0-9A-Za-z_-]` or the non-ASCII range need escaping
+css_escape_pattern = re.compile(
+    r'^(-?)([0-9])|[^0-9A-Za-z_\-\x80-\U0010FFFF]'
+)
+
+def _escape_css_match(match: re.Match) -> str:
+    leading_digit = match.group(2)
+
+    if leading_digit is not None:
+        return f'{match.group(1)}\\{ord(leading_digit):x} '
+
+    char = match.group()
+    code_unit = ord(char)
+
+    if code_unit == 0x0000:
+        return '\uFFFD'
+    elif code_unit <= 0x001F or code_unit == 0x007F:
+        return f'\\{code_unit:x} '
+    else:
+        return f'\\{char}'
+
 # Based on this script: https://github.com/mathiasbynens/CSS.escape/blob/master/css.escape.js
 def escape_css(css: str) -> str:
     if css == '-':
         return f'\\{css}'
 
-    result = ''
-
-    for i, code_unit in enumerate(map(ord, css)):
-        if code_unit == 0x0000:
-            result += '\uFFFD'
-        elif (
-            0x0001 <= code_unit <= 0x001F or \
-            code_unit == 0x007F or \
-            (
-                0x0030 <= code_unit <= 0x0039 and \
-                    i == 0 or (i == 1 and css.startswith('-'))
-            )
-        ):
-            result += f'\\{code_unit:x} '
-        elif (
-            code_unit >= 0x0080 or
-            code_unit == 0x002D or
-            code_unit == 0x005F or
-            0x0030 <= code_unit <= 0x0039 or
-            0x0041 <= code_unit <= 0x005A or
-            0x0061 <= code_unit <= 0x007A
-        ):
-            result += css[i]
-        else:
-            result += f'\\{css[i]}'
-
-    return result
+    # Plain ASCII names like `nav-item` need no escaping at all
+    if (
+        css.isascii() and
+        not css.startswith('-') and
+        css.replace('-', '_').isidentifier()
+    ):
+        return css
+
+    return css_escape_pattern.sub(_escape_css_match, css)